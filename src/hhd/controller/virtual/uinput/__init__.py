@@ -1,10 +1,13 @@
+import array
 import logging
+import os
+import struct
 import time
 from typing import Sequence
 
 from evdev import UInput
 
-from hhd.controller.base import Consumer, Event, Producer, can_read
+from hhd.controller.base import Consumer, Event, Producer
 from hhd.controller.const import Axis, Button
 
 from .const import *
@@ -18,6 +21,50 @@ _cache_motions = ControllerCache()
 _cache_volume = ControllerCache()
 
 MAX_IMU_SYNC_DELAY = 2
+IMU_TS_CODES = ("accel_ts", "gyro_ts", "imu_ts")
+
+# Modes for output_imu_timestamps
+IMU_TS_OFF = 0
+IMU_TS_ALL = 1
+IMU_TS_CUSTOM = 2
+
+EV_SYN = B("EV_SYN")
+EV_ABS = B("EV_ABS")
+EV_KEY = B("EV_KEY")
+EV_MSC = B("EV_MSC")
+EV_FF = B("EV_FF")
+EV_UINPUT = B("EV_UINPUT")
+SYN_REPORT = B("SYN_REPORT")
+MSC_TIMESTAMP = B("MSC_TIMESTAMP")
+ABS_MT_POSITION_X = B("ABS_MT_POSITION_X")
+ABS_MT_POSITION_Y = B("ABS_MT_POSITION_Y")
+ABS_MT_TRACKING_ID = B("ABS_MT_TRACKING_ID")
+BTN_TOOL_FINGER = B("BTN_TOOL_FINGER")
+UI_FF_UPLOAD = B("UI_FF_UPLOAD")
+UI_FF_ERASE = B("UI_FF_ERASE")
+FF_RUMBLE = B("FF_RUMBLE")
+
+# struct input_event, timestamps are filled in by the kernel
+INPUT_EVENT = struct.Struct("llHHi")
+READ_EVENTS_MAX = 64
+
+T_AXIS = 0
+T_BUTTON = 1
+T_CONFIGURATION = 2
+TYPE_IDS = {"axis": T_AXIS, "button": T_BUTTON, "configuration": T_CONFIGURATION}
+
+# Codes that need extra handling, resolved once in open()
+F_ASPECT = 1
+F_MT_X = 2
+F_MT_Y = 4
+F_TOUCH = 8
+AXIS_FLAGS = {
+    "touchpad_x": F_ASPECT | F_MT_X,
+    "touchpad_y": F_MT_Y,
+}
+BTN_FLAGS = {
+    "touchpad_touch": F_TOUCH,
+}
 
 
 class UInputDevice(Consumer, Producer):
@@ -143,10 +190,12 @@ class UInputDevice(Consumer, Producer):
         self.touchpad_aspect = 1
         self.touch_id = 1
         self.fd = self.dev.fd
+        self._rbuf = bytearray(INPUT_EVENT.size * READ_EVENTS_MAX)
         self.start = time.perf_counter()
         self.last_imu = time.perf_counter()
         self.imu_failed = False
         self.wrote = False
+        self._build_tables()
 
         if self.ignore_cmds:
             # Do not wake up if we ignore to save utilization
@@ -174,92 +223,151 @@ class UInputDevice(Consumer, Producer):
             self.fd = None
         return True
 
+    def _build_tables(self):
+        # Assign every code this device can emit a small integer id so that
+        # consume can deduplicate events with flat arrays instead of a dict.
+        self._axis_ids: dict[str, int] = {}
+        self._btn_ids: dict[str, int] = {}
+        self._axis_tbl: list[AX | None] = []
+        self._btn_tbl: list[int | None] = []
+        self._flags: list[int] = []
+
+        for code, ax in self.axis_map.items():
+            self._axis_ids[code] = len(self._axis_tbl)
+            self._axis_tbl.append(ax)
+            self._btn_tbl.append(None)
+            self._flags.append(AXIS_FLAGS.get(code, 0))
+
+        # Timestamps do not have an axis, only the ones that are output
+        # get an id, so the rest are dropped by the id lookup
+        if self.output_imu_timestamps is True:
+            self._imu_mode = IMU_TS_ALL
+            self._ts_codes = frozenset(IMU_TS_CODES)
+        elif isinstance(self.output_imu_timestamps, str) and self.output_imu_timestamps:
+            self._imu_mode = IMU_TS_CUSTOM
+            self._ts_codes = frozenset((self.output_imu_timestamps,))
+        else:
+            self._imu_mode = IMU_TS_OFF
+            self._ts_codes = frozenset()
+        for code in self._ts_codes:
+            if code not in self._axis_ids:
+                self._axis_ids[code] = len(self._axis_tbl)
+                self._axis_tbl.append(None)
+                self._btn_tbl.append(None)
+                self._flags.append(0)
+
+        for code, btn in self.btn_map.items():
+            self._btn_ids[code] = len(self._btn_tbl)
+            self._axis_tbl.append(None)
+            self._btn_tbl.append(btn)
+            self._flags.append(BTN_FLAGS.get(code, 0))
+
+        n = len(self._axis_tbl)
+        self._seen = array.array("q", [0] * n)
+        self._last_val = array.array("i", [0] * n)
+        self._epoch = 0
+
     def consume(self, events: Sequence[Event]):
         if not self.dev:
             return
 
         should_syn = not self.sync_gyro
-        wrote = {}
         ts = 0
-        for ev in reversed(events):
-            key = (ev["type"], ev["code"])
-            if key in wrote:
-                # skip duplicate events that were caused due to a delay
-                # only keep the last button value by iterating reversed
-                continue
-            match ev["type"]:
-                case "axis":
-                    if not should_syn and "imu_ts" in ev["code"]:
-                        self.imu_failed = False
-                        self.last_imu = time.perf_counter()
-                        should_syn = True
-
-                    if ev["code"] in self.axis_map:
-                        ax = self.axis_map[ev["code"]]
-                        if ev["code"] == "touchpad_x":
-                            val = int(
-                                self.touchpad_aspect
-                                * (ax.scale * ev["value"] + ax.offset)
-                            )
-                        else:
-                            val = int(ax.scale * ev["value"] + ax.offset)
-                        if ax.bounds:
-                            val = min(max(val, ax.bounds[0]), ax.bounds[1])
-                        self.dev.write(B("EV_ABS"), ax.id, val)
-                        wrote[key] = val
-
-                        if ev["code"] == "touchpad_x":
-                            self.dev.write(B("EV_ABS"), B("ABS_MT_POSITION_X"), val)
-                        elif ev["code"] == "touchpad_y":
-                            self.dev.write(B("EV_ABS"), B("ABS_MT_POSITION_Y"), val)
-
-                    elif (
-                        self.output_imu_timestamps is True
-                        and ev["code"]
-                        in (
-                            "accel_ts",
-                            "gyro_ts",
-                            "imu_ts",
-                        )
-                    ) or ev["code"] == self.output_imu_timestamps:
-                        # We have timestamps with ns accuracy.
-                        # Evdev expects us accuracy
-                        self.last_imu_ts = ev["value"]
-                        ts = (ev["value"] // 1000) % (2**31)
-                        self.dev.write(B("EV_MSC"), B("MSC_TIMESTAMP"), ts)
-                        wrote[key] = ts
-                case "button":
-                    if ev["code"] in self.btn_map:
-                        if ev["code"] == "touchpad_touch":
-                            self.dev.write(
-                                B("EV_ABS"),
-                                B("ABS_MT_TRACKING_ID"),
-                                self.touch_id if ev["value"] else -1,
-                            )
-                            self.dev.write(
-                                B("EV_KEY"),
-                                B("BTN_TOOL_FINGER"),
-                                1 if ev["value"] else 0,
-                            )
-                            self.touch_id += 1
-                            if self.touch_id > 500:
-                                self.touch_id = 1
-                        self.dev.write(
-                            B("EV_KEY"),
-                            self.btn_map[ev["code"]],
-                            1 if ev["value"] else 0,
+
+        # Keep only the last value of each code. Events are overwritten
+        # in order and written once after the loop.
+        self._epoch += 1
+        epoch = self._epoch
+        seen = self._seen
+        last_val = self._last_val
+        flags = self._flags
+        axis_tbl = self._axis_tbl
+        btn_tbl = self._btn_tbl
+        get_axis_id = self._axis_ids.get
+        get_btn_id = self._btn_ids.get
+        get_type = TYPE_IDS.get
+        touched = []
+        for ev in events:
+            t = get_type(ev["type"], -1)
+            if t == T_AXIS:
+                code = ev["code"]
+                if not should_syn and "imu_ts" in code:
+                    self.imu_failed = False
+                    self.last_imu = time.perf_counter()
+                    should_syn = True
+
+                idx = get_axis_id(code)
+                if idx is None:
+                    continue
+
+                ax = axis_tbl[idx]
+                if ax is not None:
+                    if flags[idx] & F_ASPECT:
+                        val = int(
+                            self.touchpad_aspect * (ax.scale * ev["value"] + ax.offset)
                         )
-                        wrote[key] = ev["value"]
+                    else:
+                        val = int(ax.scale * ev["value"] + ax.offset)
+                    if ax.bounds:
+                        val = min(max(val, ax.bounds[0]), ax.bounds[1])
+                else:
+                    # Only output timestamps have an id without an axis
+                    # We have timestamps with ns accuracy.
+                    # Evdev expects us accuracy
+                    self.last_imu_ts = ev["value"]
+                    val = int(ev["value"] // 1000) % (2**31)
+            elif t == T_BUTTON:
+                idx = get_btn_id(ev["code"])
+                if idx is None:
+                    continue
+                val = 1 if ev["value"] else 0
+            else:
+                if t == T_CONFIGURATION and ev["code"] == "touchpad_aspect_ratio":
+                    self.touchpad_aspect = float(ev["value"])
+                continue
 
-                case "configuration":
-                    if ev["code"] == "touchpad_aspect_ratio":
-                        self.touchpad_aspect = float(ev["value"])
+            last_val[idx] = val
+            if seen[idx] != epoch:
+                seen[idx] = epoch
+                touched.append(idx)
+
+        # Write all events with a single syscall
+        buf = bytearray()
+        pack = INPUT_EVENT.pack
+        wrote = False
+        for idx in touched:
+            val = last_val[idx]
+            f = flags[idx]
+            ax = axis_tbl[idx]
+            btn = btn_tbl[idx]
+            if ax is not None:
+                wrote = True
+                buf += pack(0, 0, EV_ABS, ax.id, val)
+                if f & F_MT_X:
+                    buf += pack(0, 0, EV_ABS, ABS_MT_POSITION_X, val)
+                elif f & F_MT_Y:
+                    buf += pack(0, 0, EV_ABS, ABS_MT_POSITION_Y, val)
+            elif btn is not None:
+                wrote = True
+                if f & F_TOUCH:
+                    buf += pack(
+                        0, 0, EV_ABS, ABS_MT_TRACKING_ID, self.touch_id if val else -1
+                    )
+                    buf += pack(0, 0, EV_KEY, BTN_TOOL_FINGER, val)
+                    self.touch_id += 1
+                    if self.touch_id > 500:
+                        self.touch_id = 1
+                buf += pack(0, 0, EV_KEY, btn, val)
+            else:
+                ts = val
+                buf += pack(0, 0, EV_MSC, MSC_TIMESTAMP, ts)
 
-        if wrote and self.output_timestamps:
+        if wrote and self.output_timestamps and not ts:
+            # Skip if the IMU already provided a timestamp for this report.
             # We have timestamps with ns accuracy.
             # Evdev expects us accuracy
             ts = (time.perf_counter_ns() // 1000) % (2**31)
-            self.dev.write(B("EV_MSC"), B("MSC_TIMESTAMP"), ts)
+            buf += pack(0, 0, EV_MSC, MSC_TIMESTAMP, ts)
 
         if self.sync_gyro:
             curr = time.perf_counter()
@@ -269,63 +377,76 @@ class UInputDevice(Consumer, Producer):
                     f"IMU Did not send information for {MAX_IMU_SYNC_DELAY}s. Disabling Gyro Sync."
                 )
 
-        self.wrote = self.wrote or bool(wrote)
+        self.wrote = self.wrote or bool(touched)
         if (
             self.wrote
             and (should_syn or not self.sync_gyro or self.imu_failed)
-            and (not self.output_imu_timestamps or ts)
+            and (self._imu_mode == IMU_TS_OFF or ts)
         ):
-            self.dev.syn()
+            buf += pack(0, 0, EV_SYN, SYN_REPORT, 0)
             self.wrote = False
 
+        if buf:
+            os.write(self.fd, buf)
+
     def produce(self, fds: Sequence[int]) -> Sequence[Event]:
         if self.ignore_cmds or not self.fd or not self.fd in fds or not self.dev:
             return []
 
         out: Sequence[Event] = []
 
-        while can_read(self.fd):
-            for ev in self.dev.read():
-                if ev.type == B("EV_MSC") and ev.code == B("MSC_TIMESTAMP"):
-                    # Skip timestamp feedback
-                    # TODO: Figure out why it feedbacks
-                    pass
-                elif ev.type == B("EV_UINPUT"):
-                    if ev.code == B("UI_FF_UPLOAD"):
-                        # Keep uploaded effect to apply on input
-                        upload = self.dev.begin_upload(ev.value)
-                        if upload.effect.type == B("FF_RUMBLE"):
-                            data = upload.effect.u.ff_rumble_effect
-
-                            self.rumble = {
-                                "type": "rumble",
-                                "code": "main",
-                                "weak_magnitude": data.weak_magnitude / 0xFFFF,
-                                "strong_magnitude": data.strong_magnitude / 0xFFFF,
-                            }
-                        self.dev.end_upload(upload)
-                    elif ev.code == B("UI_FF_ERASE"):
-                        # Ignore erase events
-                        erase = self.dev.begin_erase(ev.value)
-                        erase.retval = 0
-                        self.dev.end_erase(erase)
-                elif ev.type == B("EV_FF") and ev.value:
-                    if self.rumble:
-                        out.append(self.rumble)
-                    else:
-                        logger.warn(
-                            f"Rumble requested but a rumble effect has not been uploaded.\n{ev}"
-                        )
-                elif ev.type == B("EV_FF") and not ev.value:
-                    out.append(
-                        {
+        # The fd is non-blocking and the main loop wakes us up again if there
+        # are events left, so read once instead of polling until empty.
+        try:
+            n = os.readv(self.fd, [self._rbuf])
+        except BlockingIOError:
+            return out
+
+        for _, _, ev_type, ev_code, ev_value in INPUT_EVENT.iter_unpack(
+            memoryview(self._rbuf)[: n - n % INPUT_EVENT.size]
+        ):
+            if ev_type == EV_MSC and ev_code == MSC_TIMESTAMP:
+                # Skip timestamp feedback
+                # TODO: Figure out why it feedbacks
+                pass
+            elif ev_type == EV_UINPUT:
+                if ev_code == UI_FF_UPLOAD:
+                    # Keep uploaded effect to apply on input
+                    upload = self.dev.begin_upload(ev_value)
+                    if upload.effect.type == FF_RUMBLE:
+                        data = upload.effect.u.ff_rumble_effect
+
+                        self.rumble = {
                             "type": "rumble",
                             "code": "main",
-                            "weak_magnitude": 0,
-                            "strong_magnitude": 0,
+                            "weak_magnitude": data.weak_magnitude / 0xFFFF,
+                            "strong_magnitude": data.strong_magnitude / 0xFFFF,
                         }
-                    )
+                    self.dev.end_upload(upload)
+                elif ev_code == UI_FF_ERASE:
+                    # Ignore erase events
+                    erase = self.dev.begin_erase(ev_value)
+                    erase.retval = 0
+                    self.dev.end_erase(erase)
+            elif ev_type == EV_FF and ev_value:
+                if self.rumble:
+                    out.append(self.rumble)
                 else:
-                    logger.info(f"Controller ev received unhandled event:\n{ev}")
+                    logger.warn(
+                        f"Rumble requested but a rumble effect has not been uploaded (effect {ev_code})."
+                    )
+            elif ev_type == EV_FF and not ev_value:
+                out.append(
+                    {
+                        "type": "rumble",
+                        "code": "main",
+                        "weak_magnitude": 0,
+                        "strong_magnitude": 0,
+                    }
+                )
+            else:
+                logger.info(
+                    f"Controller ev received unhandled event: type {ev_type}, code {ev_code}, value {ev_value}"
+                )
 
         return out
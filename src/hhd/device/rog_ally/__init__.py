@@ -35,6 +35,8 @@ class RogAllyControllersPlugin(HHDPlugin):
         self.emit = emit
         self.context = context
         self.prev = None
+        self.prev_src = None
+        self.prev_rev = -1
 
     def settings(self) -> HHDSettings:
         from .base import LIMIT_DEFAULTS
@@ -53,6 +55,12 @@ class RogAllyControllersPlugin(HHDPlugin):
 
         fix_limits(conf, "controllers.rog_ally.limits", LIMIT_DEFAULTS(self.ally_x))
 
+        # Skip copying and comparing the settings if nothing changed
+        if conf is self.prev_src and conf.revision == self.prev_rev:
+            return
+        self.prev_src = conf
+        self.prev_rev = conf.revision
+
         new_conf = conf["controllers.rog_ally"]
         if new_conf == self.prev:
             return
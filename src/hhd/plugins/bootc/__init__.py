@@ -6,7 +6,7 @@ import signal
 import subprocess
 import shutil
 import time
-from threading import Lock, Thread
+from threading import Event as TEvent, Lock, Thread
 from typing import Literal, Sequence
 
 from hhd.i18n import _
@@ -16,6 +16,7 @@ from hhd.plugins.conf import Config
 logger = logging.getLogger(__name__)
 
 REFRESH_HZ = 3
+STATUS_CACHE_TTL = 2
 PROGRESS_STAGES = {
     "pulling": (_("Downloading:"), 0, 80),
     "importing": (_("Importing:"), 80, 10),
@@ -29,6 +30,20 @@ BRANCHES = os.environ.get(
     "HHD_BOOTC_BRANCHES", "stable:Stable,testing:Testing,unstable:Unstable"
 )
 
+
+def parse_branches(branches: str):
+    names = []
+    display = {}
+    for branch in branches.split(","):
+        name, disp = branch.split(":")
+        names.append(name)
+        display[name] = disp
+    return tuple(names), display
+
+
+# The first branch is the default one
+BRANCH_NAMES, BRANCH_DISPLAY = parse_branches(BRANCHES)
+
 REF_PREFIX = "§ "
 DEFAULT_PREFIX = "◉ "
 
@@ -74,29 +89,100 @@ STAGES = Literal[
     "rebase_dialog",
     "loading",
     "loading_rebase",
+    "loading_status",
     "loading_cancellable",
 ]
 
 
+class AsyncProc:
+    """Runs a command and collects its output without blocking the main loop.
+    Once the command finishes, a refresh event is emitted to wake up the loop."""
+
+    def __init__(self, cmd: list, emit=None) -> None:
+        self.data = bytearray()
+        self.proc = None
+        self.t = None
+        self.finished = TEvent()
+
+        try:
+            self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+            self.t = Thread(target=self._reader, args=(emit,), daemon=True)
+            self.t.start()
+        except Exception as e:
+            logger.error(f"Failed to run command: {e}")
+            self.finished.set()
+
+    def _reader(self, emit):
+        assert self.proc and self.proc.stdout
+        fd = self.proc.stdout
+        try:
+            while data := os.read(fd.fileno(), 65536):
+                self.data.extend(data)
+            self.proc.wait()
+        except Exception as e:
+            logger.error(f"Failed to read command output: {e}")
+        finally:
+            fd.close()
+            self.finished.set()
+
+        if emit:
+            emit({"type": "special", "event": "refresh"})
+
+    def done(self):
+        return self.finished.is_set()
+
+    def output(self):
+        if not self.proc or self.proc.returncode:
+            return None
+        return bytes(self.data)
+
+    def close(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+        if self.t:
+            self.t.join()
+
+
+_status_cache: dict = {"t": 0, "val": None}
+
+
 def get_bootc_status():
+    # Avoid calling bootc again on quick UI transitions
+    if (
+        _status_cache["val"] is not None
+        and time.perf_counter() - _status_cache["t"] < STATUS_CACHE_TTL
+    ):
+        return _status_cache["val"]
+    return None
+
+
+def parse_bootc_status(output: bytes | None):
     try:
-        output = subprocess.check_output(BOOTC_STATUS_CMD).decode("utf-8")
-        return json.loads(output)
+        if output is None:
+            raise RuntimeError("bootc status failed")
+        status = json.loads(output)
+        _status_cache["t"] = time.perf_counter()
+        _status_cache["val"] = status
+        return status
     except Exception as e:
         logger.error(f"Failed to get bootc status: {e}")
         return {}
 
 
+def invalidate_bootc_status():
+    _status_cache["val"] = None
+
+
 def get_ref_from_status(status: dict | None):
     return (((status or {}).get("spec", None) or {}).get("image", None) or {}).get(
         "image", ""
     )
 
 
-def get_branch(ref: str, branches: dict, fallback: bool = True):
-    if ":" not in ref:
-        return next(iter(branches))
-    curr_tag = ref[ref.rindex(":") + 1 :]
+def get_branch(ref: str, branches: Sequence[str], fallback: bool = True):
+    _, sep, curr_tag = ref.rpartition(":")
+    if not sep:
+        return branches[0]
 
     for branch in branches:
         if branch in curr_tag:
@@ -105,13 +191,20 @@ def get_branch(ref: str, branches: dict, fallback: bool = True):
     if not fallback:
         return None
     # If no tag, assume it is the first one
-    return next(iter(branches))
+    return branches[0]
+
 
+def replace_tag(ref: str, tag: str):
+    head, sep, _ = ref.rpartition(":")
+    return (head if sep else ref) + ":" + tag
 
-def get_rebase_refs(ref: str, tags, lim: int = 7, branches: dict = {}):
-    logger.info(f"Getting rebase refs for {ref}")
+
+def get_rebase_refs(
+    output: bytes | None, tags, lim: int = 7, branches: Sequence[str] = ()
+):
     try:
-        output = subprocess.check_output(SKOPEO_REBASE_CMD(ref)).decode("utf-8")
+        if output is None:
+            raise RuntimeError("skopeo inspect failed")
         data = json.loads(output)
         versions = data.get("RepoTags", [])
 
@@ -125,12 +218,47 @@ def get_rebase_refs(ref: str, tags, lim: int = 7, branches: dict = {}):
         logger.error(f"Failed to get rebase refs: {e}")
 
 
-def run_command_threaded(cmd: list):
+def _pidfd_waiter(pidfd: int, exited: TEvent, emit):
+    try:
+        select.select([pidfd], [], [])
+    except Exception as e:
+        logger.error(f"Failed to wait for command: {e}")
+    finally:
+        os.close(pidfd)
+    exited.set()
+    # Wake up the main loop so the plugin updates immediately
+    if emit:
+        emit({"type": "special", "event": "refresh"})
+
+
+def watch_exit(proc: subprocess.Popen, emit):
+    # A pidfd becomes readable when the process exits, which lets us avoid
+    # polling the process on every update. Fall back to poll() otherwise.
+    try:
+        pidfd = os.pidfd_open(proc.pid)
+    except Exception as e:
+        logger.warning(f"Could not open pidfd, falling back to polling: {e}")
+        return
+    exited = TEvent()
+    Thread(target=_pidfd_waiter, args=(pidfd, exited, emit), daemon=True).start()
+    proc.exited = exited  # type: ignore
+
+
+def has_exited(proc: subprocess.Popen):
+    exited = getattr(proc, "exited", None)
+    if exited is not None and not exited.is_set():
+        return False
+    return proc.poll() is not None
+
+
+def run_command_threaded(cmd: list, emit=None):
     try:
-        return subprocess.Popen(
+        proc = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
         )
+        watch_exit(proc, emit)
+        return proc
     except Exception as e:
         logger.error(f"Failed to run command: {e}")
 
@@ -188,6 +316,7 @@ def run_command_threaded_progress(cmd: list, emit, friendly, lock):
             stderr=subprocess.DEVNULL,
         )
         os.close(w)
+        watch_exit(proc, emit)
 
         obj = {}
         fd = os.fdopen(r, "r")
@@ -230,18 +359,18 @@ class BootcPlugin(HHDPlugin):
         self.branch_name = None
         self.branch_ref = None
         self.checked_update = False
-        self.t = None
+        self.status_proc = None
+        self.rebase_proc = None
         self.t_data = None
+        self.t_branch = None
+        self.t_versions = {}
         self.progress_lock = Lock()
         self.progress = None
         self.staged = ""
         self.cached_version = ""
         self.emit = None
 
-        self.branches = {}
-        for branch in BRANCHES.split(","):
-            name, display = branch.split(":")
-            self.branches[name] = display
+        self.branches = BRANCH_DISPLAY
 
         self.status = None
         self.enabled = True
@@ -272,14 +401,28 @@ class BootcPlugin(HHDPlugin):
         else:
             logger.warning("Bootc progress support not detected")
 
-    def get_version(self, s):
-        assert self.status
-        return (
-            (self.status.get("status", {}).get(s, None) or {}).get("image", None) or {}
-        ).get("version", "")
-
     def _init(self, conf: Config):
-        self.status = get_bootc_status()
+        if self.status_proc:
+            self.status_proc.close()
+            self.status_proc = None
+
+        status = get_bootc_status()
+        if status is not None:
+            self._load_status(conf, status)
+            return
+
+        # Fetch status in the background to avoid stalling the main loop
+        self.status_proc = AsyncProc(BOOTC_STATUS_CMD, self.emit)
+        self.state = "loading_status"
+        conf["updates.bootc.stage.mode"] = "loading"
+        conf["updates.bootc.stage.loading.progress"] = {
+            "text": _("Loading"),
+            "value": None,
+            "unit": None,
+        }
+
+    def _load_status(self, conf: Config, status: dict):
+        self.status = status
 
         if is_incompatible(self.status):
             conf["updates.bootc.stage.mode"] = "incompatible"
@@ -288,32 +431,38 @@ class BootcPlugin(HHDPlugin):
             conf[f"updates.bootc.steamos-update"] = "incompatible"
             return
 
-        ref = ((self.status.get("spec", None) or {}).get("image", None) or {}).get(
-            "image", ""
-        )
-        img = ref
-        if "/" in img:
-            img = img[img.rfind("/") + 1 :]
+        spec = status.get("spec", None) or {}
+        status_sec = status.get("status", None) or {}
+        staged_sec = status_sec.get("staged", None) or {}
+        booted_sec = status_sec.get("booted", None) or {}
+        rollback_sec = status_sec.get("rollback", None) or {}
+
+        ref = (spec.get("image", None) or {}).get("image", "")
+        staged_v = (staged_sec.get("image", None) or {}).get("version", "")
+        booted_v = (booted_sec.get("image", None) or {}).get("version", "")
+        rollback_v = (rollback_sec.get("image", None) or {}).get("version", "")
+
+        img = ref.rpartition("/")[2]
 
         # Find branch and replace tag
-        branch = get_branch(img, self.branches)
+        branch = get_branch(img, BRANCH_NAMES)
         rebased_ver = None
         self.branch_name = branch
         self.branch_ref = None
         has_rebased = False
         if branch:
-            if ":" in img:
-                tag = img[img.rindex(":") + 1 :]
+            head, sep, tag = img.rpartition(":")
+            if sep:
                 if tag != branch:
                     rebased_ver = tag
                     has_rebased = True
-                    self.branch_ref = ref.split(":")[0] + ":" + branch
-                img = img[: img.rindex(":") + 1] + branch
+                    self.branch_ref = replace_tag(ref, branch)
+                img = head + ":" + branch
         if img:
             conf["updates.bootc.image"] = img
 
         # If we have a staged update, that will boot first
-        self.staged = og = s = self.get_version("staged")
+        self.staged = og = s = staged_v
         staged = False
         if s:
             s = DEFAULT_PREFIX + s
@@ -326,12 +475,8 @@ class BootcPlugin(HHDPlugin):
 
         # Check if the user selected rollback
         # Then that will be the default, provided there is a rollback
-        rollback = (
-            not staged
-            and (self.status.get("spec", None) or {}).get("bootOrder", None)
-            == "rollback"
-        )
-        s = self.get_version("rollback")
+        rollback = not staged and spec.get("bootOrder", None) == "rollback"
+        s = rollback_v
         if s and rollback:
             s = DEFAULT_PREFIX + s
         else:
@@ -339,7 +484,7 @@ class BootcPlugin(HHDPlugin):
         conf[f"updates.bootc.rollback"] = s
 
         # Otherwise, the booted version will be the default
-        og = s = self.get_version("booted")
+        og = s = booted_v
         if s and not rollback and not staged:
             s = DEFAULT_PREFIX + s
         if s and rebased_ver and og in rebased_ver:
@@ -349,11 +494,10 @@ class BootcPlugin(HHDPlugin):
         conf["updates.bootc.status"] = ""
         self.updated = True
 
-        cached = self.status.get("status", {}).get("booted", {}).get("cachedUpdate", {})
-        cached_version = cached.get("version", "") if cached else ""
-        cached_img = cached.get("image", {}).get("image", "") if cached else ""
-        if "/" in cached_img:
-            cached_img = cached_img[cached_img.rfind("/") + 1 :]
+        cached = booted_sec.get("cachedUpdate", None) or {}
+        cached_version = cached.get("version", "")
+        cached_img = (cached.get("image", None) or {}).get("image", "")
+        cached_img = cached_img.rpartition("/")[2]
         self.cached_version = cached_version
 
         if self.checked_update:
@@ -361,17 +505,13 @@ class BootcPlugin(HHDPlugin):
         else:
             conf[f"updates.bootc.update"] = None
 
-        if (
-            cached_version
-            and cached_img == img
-            and cached_version != self.get_version("staged")
-        ):
+        if cached_version and cached_img == img and cached_version != staged_v:
             conf["updates.bootc.stage.mode"] = "ready"
             self.state = "ready"
             conf[f"updates.bootc.update"] = cached_version
             conf[f"updates.bootc.steamos-update"] = "has-update"
             conf["updates.bootc.steamos-target"] = None
-        elif self.get_version("staged"):
+        elif staged:
             conf["updates.bootc.stage.mode"] = "ready_updated"
             self.state = "ready_updated"
             conf[f"updates.bootc.steamos-update"] = "updated"
@@ -414,7 +554,9 @@ class BootcPlugin(HHDPlugin):
 
                 steamos = conf.get("updates.bootc.steamos-update", None)
                 target = conf.get("updates.bootc.steamos-target", None)
-                if target and (target not in BRANCHES or target == self.branch_name):
+                if target and (
+                    target not in BRANCH_DISPLAY or target == self.branch_name
+                ):
                     target = None
 
                 # Handle steamos polkit
@@ -432,11 +574,7 @@ class BootcPlugin(HHDPlugin):
 
                 if steamos_upd and target:
                     curr = get_ref_from_status(self.status)
-                    next_ref = (
-                        (curr[: curr.rindex(":")] if ":" in curr else curr)
-                        + ":"
-                        + target
-                    )
+                    next_ref = replace_tag(curr, target)
                     if next_ref == curr:
                         conf["updates.bootc.steamos-target"] = None
                         self._init(conf)
@@ -447,7 +585,7 @@ class BootcPlugin(HHDPlugin):
                             cmd, self.emit, target, self.progress_lock
                         )
                     else:
-                        self.proc = run_command_threaded(cmd)
+                        self.proc = run_command_threaded(cmd, self.emit)
                     conf["updates.bootc.stage.mode"] = "loading_cancellable"
                     conf["updates.bootc.stage.loading_cancellable.progress"] = {
                         "text": _("Rebasing to "),
@@ -467,7 +605,7 @@ class BootcPlugin(HHDPlugin):
                                 self.progress_lock,
                             )
                         else:
-                            self.proc = run_command_threaded(cmd)
+                            self.proc = run_command_threaded(cmd, self.emit)
                         conf["updates.bootc.stage.mode"] = "loading_cancellable"
                         conf["updates.bootc.stage.loading_cancellable.progress"] = {
                             "text": _("Updating to latest "),
@@ -487,7 +625,9 @@ class BootcPlugin(HHDPlugin):
                                 self.progress_lock,
                             )
                         else:
-                            self.proc = run_command_threaded(BOOTC_UPDATE_CMD)
+                            self.proc = run_command_threaded(
+                                BOOTC_UPDATE_CMD, self.emit
+                            )
                         conf["updates.bootc.stage.mode"] = "loading_cancellable"
                         conf["updates.bootc.stage.loading_cancellable.progress"] = {
                             "text": _("Updating... "),
@@ -496,7 +636,7 @@ class BootcPlugin(HHDPlugin):
                         }
                     else:
                         self.state = "loading"
-                        self.proc = run_command_threaded(BOOTC_CHECK_CMD)
+                        self.proc = run_command_threaded(BOOTC_CHECK_CMD, self.emit)
                         self.checked_update = True
                         conf["updates.bootc.stage.mode"] = "loading"
                         conf["updates.bootc.stage.loading.progress"] = {
@@ -507,7 +647,7 @@ class BootcPlugin(HHDPlugin):
                 elif revert:
                     self.checked_update = False
                     self.state = "loading"
-                    self.proc = run_command_threaded(BOOTC_ROLLBACKCMD)
+                    self.proc = run_command_threaded(BOOTC_ROLLBACKCMD, self.emit)
                     conf["updates.bootc.stage.mode"] = "loading"
                     if e == "ready_updated":
                         text = _("Undoing Update...")
@@ -526,13 +666,8 @@ class BootcPlugin(HHDPlugin):
                         self._init(conf)
                     else:
                         # Get branch that should be default
-                        curr = (
-                            (self.status or {})
-                            .get("spec", {})
-                            .get("image", {})
-                            .get("image", "")
-                        )
-                        default = get_branch(curr, self.branches)
+                        curr = get_ref_from_status(self.status)
+                        default = get_branch(curr, BRANCH_NAMES)
                         conf["updates.bootc.stage.rebase.branch"] = default
 
                         # Prepare loader
@@ -543,14 +678,10 @@ class BootcPlugin(HHDPlugin):
                             "unit": None,
                         }
 
-                        # Launch loader thread
+                        # Launch loader
+                        logger.info(f"Getting rebase refs for {curr}")
                         self.t_data = {}
-                        self.t = Thread(
-                            target=get_rebase_refs,
-                            args=(curr, self.t_data),
-                            kwargs={"branches": self.branches},
-                        )
-                        self.t.start()
+                        self.rebase_proc = AsyncProc(SKOPEO_REBASE_CMD(curr), self.emit)
                         self.state = "loading_rebase"
                 elif reboot:
                     logger.info("User pressed reboot in updater. Rebooting...")
@@ -560,7 +691,7 @@ class BootcPlugin(HHDPlugin):
             case "incompatible":
                 if conf.get_action("updates.bootc.stage.incompatible.reset"):
                     self.state = "loading"
-                    self.proc = run_command_threaded(RPM_OSTREE_RESET)
+                    self.proc = run_command_threaded(RPM_OSTREE_RESET, self.emit)
                     conf["updates.bootc.stage.mode"] = "loading"
                     conf["updates.bootc.stage.loading.progress"] = {
                         "text": _("Removing Customizations..."),
@@ -576,44 +707,60 @@ class BootcPlugin(HHDPlugin):
 
                 conf["updates.bootc.update"] = None
                 if e == "loading_rebase":
-                    if self.t is None:
+                    if self.rebase_proc is None:
                         self._init(conf)
                         return
-                    elif not self.t.is_alive():
-                        self.t = None
+                    elif self.rebase_proc.done():
+                        self.t_data = {}
+                        get_rebase_refs(
+                            self.rebase_proc.output(),
+                            self.t_data,
+                            branches=BRANCH_NAMES,
+                        )
+                        self.rebase_proc = None
+                        self.t_branch = None
                         self.state = "rebase_dialog"
                         conf["updates.bootc.stage.mode"] = "rebase"
+                        if self.t_data:
+                            conf["updates.bootc.stage.rebase.version_error"] = None
+                        else:
+                            conf["updates.bootc.stage.rebase.version_error"] = _(
+                                "Failed to load previous versions"
+                            )
                     else:
                         return
 
                 apply = conf.get_action("updates.bootc.stage.rebase.apply")
                 cancel = conf.get_action("updates.bootc.stage.rebase.cancel")
-                branch = conf.get(
-                    "updates.bootc.stage.rebase.branch", next(iter(self.branches))
-                )
+                branch = conf.get("updates.bootc.stage.rebase.branch", BRANCH_NAMES[0])
 
                 version = "latest"
-                if not self.t_data:
-                    conf["updates.bootc.stage.rebase.version_error"] = _(
-                        "Failed to load previous versions"
+                if self.t_data and branch in self.t_data:
+                    # Only rebuild the options when the branch changes
+                    changed = branch != self.t_branch
+                    if changed:
+                        self.t_branch = branch
+                        self.t_versions = {
+                            k.replace(".", ""): k for k in self.t_data[branch]
+                        }
+                    bdata = self.t_versions
+
+                    curr = conf.get(
+                        "updates.bootc.stage.rebase.version.value", "latest"
                     )
-                else:
-                    conf["updates.bootc.stage.rebase.version_error"] = None
-                    if branch in self.t_data:
-                        bdata = {k.replace(".", ""): k for k in self.t_data[branch]}
-                        version = conf.get(
-                            "updates.bootc.stage.rebase.version.value", "latest"
-                        )
+                    version = curr if curr in bdata else "latest"
+                    if changed or version != curr:
+                        # Clear first, otherwise the old options are merged
                         conf["updates.bootc.stage.rebase.version"] = None
                         conf["updates.bootc.stage.rebase.version"] = {
                             "options": {
                                 "latest": "Latest",
                                 **bdata,
                             },
-                            "value": version if version in bdata else "latest",
+                            "value": version,
                         }
-                        # Readd . since config system does not support them
-                        version = bdata.get(version, "latest")
+                    # Readd . since config system does not support them
+                    version = bdata.get(version, "latest")
 
                 if cancel:
                     self._init(conf)
@@ -622,11 +769,7 @@ class BootcPlugin(HHDPlugin):
                         version = branch
 
                     curr = get_ref_from_status(self.status)
-                    next_ref = (
-                        (curr[: curr.rindex(":")] if ":" in curr else curr)
-                        + ":"
-                        + version
-                    )
+                    next_ref = replace_tag(curr, version)
                     if next_ref == curr:
                         self._init(conf)
                     else:
@@ -637,7 +780,7 @@ class BootcPlugin(HHDPlugin):
                                 cmd, self.emit, version, self.progress_lock
                             )
                         else:
-                            self.proc = run_command_threaded(cmd)
+                            self.proc = run_command_threaded(cmd, self.emit)
                         conf["updates.bootc.stage.mode"] = "loading_cancellable"
                         conf["updates.bootc.stage.loading_cancellable.progress"] = {
                             "text": _("Rebasing to "),
@@ -652,7 +795,8 @@ class BootcPlugin(HHDPlugin):
                 )
                 if self.proc is None:
                     self._init(conf)
-                elif self.proc.poll() is not None:
+                elif has_exited(self.proc):
+                    invalidate_bootc_status()
                     self._init(conf)
                     self.proc = None
                 elif cancel:
@@ -660,6 +804,7 @@ class BootcPlugin(HHDPlugin):
                     self.proc.send_signal(signal.SIGINT)
                     self.proc.wait()
                     self.proc = None
+                    invalidate_bootc_status()
                     self._init(conf)
                 elif self.progress:
                     with self.progress_lock:
@@ -673,10 +818,18 @@ class BootcPlugin(HHDPlugin):
                                 conf["updates.bootc.steamos-update"] = f"{val}%"
                             except ValueError:
                                 pass
+            case "loading_status":
+                if self.status_proc is None:
+                    self._init(conf)
+                elif self.status_proc.done():
+                    status = parse_bootc_status(self.status_proc.output())
+                    self.status_proc = None
+                    self._load_status(conf, status)
             case "loading":
                 if self.proc is None:
                     self._init(conf)
-                elif self.proc.poll() is not None:
+                elif has_exited(self.proc):
+                    invalidate_bootc_status()
                     self._init(conf)
                     self.proc = None
 
@@ -685,10 +838,12 @@ class BootcPlugin(HHDPlugin):
             self.proc.send_signal(signal.SIGINT)
             self.proc.wait()
             self.proc = None
-        if self.t:
-            if self.t.is_alive():
-                self.t.join()
-            self.t = None
+        if self.status_proc:
+            self.status_proc.close()
+            self.status_proc = None
+        if self.rebase_proc:
+            self.rebase_proc.close()
+            self.rebase_proc = None
 
 
 def autodetect(existing: Sequence[HHDPlugin]) -> Sequence[HHDPlugin]:
@@ -92,6 +92,8 @@ class Config:
         self._conf: Pytree | MutableMapping = {}
         self._lock = Lock()
         self._updated = False
+        # Increases on every change, unlike updated which is reset
+        self._revision = 0
         self.readonly = readonly
         self.update(conf)
         self.updated = False
@@ -106,6 +108,7 @@ class Config:
                     parse_conf(conf, self._conf)
                 else:
                     self._conf = conf
+            self._revision += 1
         self.updated = True
 
     def __eq__(self, __value: object) -> bool:
@@ -136,10 +139,12 @@ class Config:
                 # FIXME: verify no regressions
                 if init != self._conf:
                     self._updated = True
+                    self._revision += 1
             else:
                 self._conf = cont
                 if self._conf != cont:
                     self._updated = True
+                    self._revision += 1
 
     def __contains__(self, key: str | tuple[str, ...]):
         with self._lock:
@@ -168,6 +173,7 @@ class Config:
             for s in seq[:-1]:
                 d = cast(Mapping, d)[s]
             del d[seq[-1]]
+            self._revision += 1
         self.updated = True
 
     def get(self, key, default: A) -> A:
@@ -197,6 +203,11 @@ class Config:
         with self._lock:
             return deepcopy(self._conf)
 
+    @property
+    def revision(self):
+        with self._lock:
+            return self._revision
+
     @property
     def updated(self):
         with self._lock:
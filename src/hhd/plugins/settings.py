@@ -1,5 +1,7 @@
+import hashlib
+import json
 import logging
-from functools import reduce
+import textwrap
 from typing import (
     Any,
     Literal,
@@ -11,7 +13,13 @@ from typing import (
     Protocol,
 )
 import time
-from copy import copy
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper, CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
 
 from .conf import Config
 
@@ -250,95 +258,111 @@ Section = Mapping[str, Container]
 HHDSettings = Mapping[str, Section]
 
 
-def parse(d: Setting | Container | Mode, prev: Sequence[str], out: MutableMapping):
-    new_prev = list(prev)
+def parse(d: Setting | Container | Mode, prefix: str, out: MutableMapping):
     match d["type"]:
         case "container":
             for k, v in d["children"].items():
-                parse(v, new_prev + [k], out)
+                parse(v, f"{prefix}.{k}", out)
         case "mode":
-            out[".".join(new_prev) + ".mode"] = d.get("default", None)
+            out[prefix + ".mode"] = d.get("default", None)
 
             for k, v in d["modes"].items():
-                parse(v, new_prev + [k], out)
+                parse(v, f"{prefix}.{k}", out)
         case other:
-            out[".".join(new_prev)] = d.get("default", None)
+            out[prefix] = d.get("default", None)
+
+
+# Defaults of the last parsed settings, which are kept alive while cached
+_settings_defaults: tuple[HHDSettings, dict] | None = None
 
 
 def parse_defaults(sets: HHDSettings):
+    global _settings_defaults
+    if _settings_defaults and _settings_defaults[0] is sets:
+        # Callers (`Config`) copy the values, a shallow copy of the keys suffices
+        return dict(_settings_defaults[1])
+
     out = {}
     for name, sec in sets.items():
         for cname, cont in sec.items():
-            parse(cont, [name, cname], out)
-    return out
+            parse(cont, f"{name}.{cname}", out)
+    _settings_defaults = (sets, out)
+    return dict(out)
+
+
+DEFAULT_TAGS = (
+    ("type", None),
+    ("title", ""),
+    ("hint", ""),
+    ("unit", ""),
+    ("tags", []),
+    ("default", None),
+)
 
+TYPE_TAGS = {
+    "multiple": (("options", {}),),
+    "discrete": (("options", []),),
+    "int": (
+        ("min", None),
+        ("max", None),
+        ("step", None),
+        ("unit", None),
+        ("smin", None),
+        ("smax", None),
+    ),
+    "float": (
+        ("min", None),
+        ("max", None),
+        ("step", None),
+        ("unit", None),
+        ("smin", None),
+        ("smax", None),
+    ),
+    "custom": (("config", None),),
+}
 
-def pick_tag(tag, default, a, b):
-    if not b:
-        return a.get(tag, default)
-    return b.get(tag, a.get(tag, default))
+# Tags of each type, type specific tags override the default ones
+ALL_TAGS = {k: DEFAULT_TAGS + v for k, v in TYPE_TAGS.items()}
 
 
-DEFAULT_TAGS = {
-    "type": None,
-    "title": "",
-    "hint": "",
-    "unit": "",
-    "tags": [],
-    "default": None,
-}
+class _NormalizedSetting(dict):
+    """Setting, container, or mode returned by `merge_reduce()`."""
 
-TYPE_TAGS = {
-    "multiple": {"options": {}},
-    "discrete": {"options": []},
-    "int": {
-        "min": None,
-        "max": None,
-        "step": None,
-        "unit": None,
-        "smin": None,
-        "smax": None,
-    },
-    "float": {
-        "min": None,
-        "max": None,
-        "step": None,
-        "unit": None,
-        "smin": None,
-        "smax": None,
-    },
-    "custom": {"config": None},
-}
+
+def merge_children(a: Mapping[str, Any], b: Mapping[str, Any]):
+    """Merges the children (or modes) of two nodes in one pass over each,
+    keeping the order of `a` followed by the new children of `b`."""
+    out = {k: merge_reduce(v, b[k]) if k in b else v for k, v in a.items()}
+    for k, v in b.items():
+        if k not in a:
+            out[k] = merge_reduce(v)
+    return out
 
 
 def merge_reduce(
     a: Setting | Container | Mode, b: Setting | Container | Mode | None = None
 ):
-    s = {}
-    for tag, default in DEFAULT_TAGS.items():
-        s[tag] = pick_tag(tag, default, a, b)
-
-    for tag, default in TYPE_TAGS.get(a["type"], {}).items():
-        s[tag] = pick_tag(tag, default, a, b)
+    if not b and isinstance(a, _NormalizedSetting):
+        # Already has all its tags, reducing it again would return a copy
+        return a
+
+    s = _NormalizedSetting()
+    tags = ALL_TAGS.get(a["type"], DEFAULT_TAGS)
+    if b:
+        for tag, default in tags:
+            s[tag] = b.get(tag, a.get(tag, default))
+    else:
+        for tag, default in tags:
+            s[tag] = a.get(tag, default)
 
     if b and b.get("type", None) == a.get("type", None):
         match s["type"]:
             case "container":
-                new_children = dict(a.get("children", {}))
-                for k, v in b.get("children", {}).items():
-                    if k in new_children:
-                        new_children[k] = merge_reduce(new_children[k], v)  # type: ignore
-                    else:
-                        new_children[k] = merge_reduce(v)  # type: ignore
-                s["children"] = new_children
+                s["children"] = merge_children(
+                    a.get("children", {}), b.get("children", {})
+                )
             case "mode":
-                new_children = dict(a.get("modes", {}))
-                for k, v in b.get("modes", {}).items():
-                    if k in new_children:
-                        new_children[k] = merge_reduce(new_children[k], v)  # type: ignore
-                    else:
-                        new_children[k] = merge_reduce(v)  # type: ignore
-                s["modes"] = new_children
+                s["modes"] = merge_children(a.get("modes", {}), b.get("modes", {}))
     else:
         if a.get("type", None) == "container":
             s["children"] = {
@@ -363,8 +387,12 @@ def merge_reduce_sec(a: Section, b: Section):
     return out
 
 
+class _MergedSettings(dict):
+    """Settings returned by `merge_reduce_secs()`, which are already normalized."""
+
+
 def merge_reduce_secs(a: HHDSettings, b: HHDSettings):
-    out = {k: merge_reduce_sec({}, v) for k, v in a.items()}
+    out = _MergedSettings({k: merge_reduce_sec({}, v) for k, v in a.items()})
     for k, v in b.items():
         out[k] = merge_reduce_sec(out.get(k, {}), v)
 
@@ -374,43 +402,49 @@ def merge_reduce_secs(a: HHDSettings, b: HHDSettings):
 def merge_settings(sets: Sequence[HHDSettings]):
     if not sets:
         return {}
-    if len(sets) > 1:
-        return reduce(merge_reduce_secs, sets)
-    return merge_reduce_secs({}, sets[0])
+    if len(sets) == 1 and isinstance(sets[0], _MergedSettings):
+        # Merging a single merged set would rebuild it unchanged
+        return sets[0]
+
+    # Only merge the sections each set contributes to, the rest of the
+    # accumulated sections are already normalized
+    out = merge_reduce_secs({}, sets[0])
+    for s in sets[1:]:
+        for k, v in s.items():
+            out[k] = merge_reduce_sec(out.get(k, {}), v)
+    return out
 
 
 def generate_desc(s: Setting | Container | Mode):
-    desc = f"*{s['title']}*\n"
+    lines = [f"*{s['title']}*"]
     if h := s.get("hint", None):
-        line = ""
-        for token in h.split(" "):
-            if len(line) + len(token) > 80:
-                desc += f"{line}\n"
-                line = ""
-            line += f"{token} "
-        if line:
-            desc += f"{line}\n"
+        # Wrap on spaces only, long words and paths are left intact
+        lines.extend(
+            textwrap.wrap(h, 80, break_long_words=False, break_on_hyphens=False)
+        )
 
     match s["type"]:
         case "mode":
-            desc += f"- modes: [{', '.join(map(str, s['modes']))}]\n"
+            lines.append(f"- modes: [{', '.join(map(str, s['modes']))}]")
         case "number":
-            desc += f"- numerical: ["
-            desc += f"{s['min'] if s.get('min', None) is not None else '-inf'}, "
-            desc += f"{s['max'] if s.get('max', None) is not None else '+inf'}]\n"
+            lines.append(
+                "- numerical: ["
+                + f"{s['min'] if s.get('min', None) is not None else '-inf'}, "
+                + f"{s['max'] if s.get('max', None) is not None else '+inf'}]"
+            )
         case "bool":
-            desc += f"- boolean: [False, True]\n"
+            lines.append(f"- boolean: [False, True]")
         case "multiple" | "discrete":
-            desc += f"- options: [{', '.join(map(str, s['options']))}]\n"
+            lines.append(f"- options: [{', '.join(map(str, s['options']))}]")
         case "action":
-            desc += f"- action: Set to True to run.\n"
+            lines.append(f"- action: Set to True to run.")
 
     if (d := s.get("default", None)) is not None:
-        desc += f"- default: {d}\n"
-    return desc[:-1]
+        lines.append(f"- default: {d}")
+    return "\n".join(lines)
 
 
-def traverse_desc(set: Setting | Container | Mode, prev: Sequence[str]):
+def traverse_desc(set: Setting | Container | Mode, prev: tuple[str, ...]):
     out = []
     out.append(
         (
@@ -423,10 +457,10 @@ def traverse_desc(set: Setting | Container | Mode, prev: Sequence[str]):
     match set["type"]:
         case "container":
             for child_name, child in set["children"].items():
-                out.extend(traverse_desc(child, [*prev, child_name]))
+                out.extend(traverse_desc(child, prev + (child_name,)))
         case "mode":
             for mode_name, mode in set["modes"].items():
-                out.extend(traverse_desc(mode, [*prev, mode_name]))
+                out.extend(traverse_desc(mode, prev + (mode_name,)))
     return out
 
 
@@ -434,121 +468,128 @@ def tranverse_desc_sec(set: HHDSettings):
     out = []
     for sec_name, sec in set.items():
         for cont_name, cnt in sec.items():
-            out.extend(traverse_desc(cnt, [sec_name, cont_name]))
+            out.extend(traverse_desc(cnt, (sec_name, cont_name)))
     return out
 
 
 def dump_comment(set: HHDSettings, header: str = STATE_HEADER):
+    # Imported here, hhd.logging imports this module through hhd.plugins
     from hhd import RASTER
 
-    out = "#\n#  "
-    out += "\n#  ".join(RASTER.split("\n"))
-    out += header
+    out = ["#\n#  ", "\n#  ".join(RASTER.split("\n")), header]
     descs = tranverse_desc_sec(set)
     for i, (path, desc, ofs, is_container) in enumerate(descs):
-        out += f"\n# {'│' * max((ofs - 1), 0)}┌> {'.'.join(path)}\n# {'│' * ofs} "
+        out.append(f"\n# {'│' * max((ofs - 1), 0)}┌> {'.'.join(path)}\n# {'│' * ofs} ")
         lines = desc.split("\n")
-        out += ("\n# " + "│" * ofs + " ").join(lines[:-1])
+        out.append(("\n# " + "│" * ofs + " ").join(lines[:-1]))
 
         next_ofs = descs[i + 1][2] if i < len(descs) - 1 else 0
         if not is_container:
             next_ofs -= 1
         next_ofs = max(min(next_ofs, ofs), 0)
-        out += f"\n# {'│' * next_ofs}{'└' * (ofs - next_ofs)} {lines[-1]}"
-        out += f"\n# {'│' * next_ofs}"
-    # out += "\n\n"
-    return out
+        out.append(f"\n# {'│' * next_ofs}{'└' * (ofs - next_ofs)} {lines[-1]}")
+        out.append(f"\n# {'│' * next_ofs}")
+    # out.append("\n\n")
+    return "".join(out)
+
+
+def unmark_setting(
+    out: MutableMapping,
+    name: str,
+    set: Setting | Mode,
+    unmark: Literal["unset", "default"],
+):
+    m = out.get(name, None)
+    # Skip writing default values
+    default = set.get("default", None)
+    if default is None and unmark != "unset":
+        out[name] = None
+    elif m is None:
+        out[name] = unmark
+    elif default == m and unmark == "default":
+        out[name] = unmark
+    else:
+        return False
+    return True
+
+
+def prune_nones(out: MutableMapping):
+    for k in [k for k, v in out.items() if v is None]:
+        del out[k]
+    return out or None
 
 
 def dump_setting(
     set: Container | Mode,
-    prev: Sequence[str],
-    conf: Config,
+    cur: Any,
     unmark: Literal["unset", "default"] = "default",
 ):
     """Finds the current settings that are set to a default value and swaps them
     for the value `default`. For settings without a default value (temporary),
-    it sets them to None to avoid setting them."""
+    it sets them to None to avoid setting them.
+
+    Works in place on `cur`, the current configuration of the setting.
+    Returns whether any setting was swapped and the new configuration, which
+    is `cur` unchanged if not."""
+    out = cur if isinstance(cur, dict) else {}
     match set["type"]:
         case "container":
-            out = {}
+            wrote = False
             for child_name, child in set["children"].items():
                 match child["type"]:
                     case "container" | "mode":
-                        s = dump_setting(child, [*prev, child_name], conf, unmark)
-                        if s:
+                        w, s = dump_setting(child, out.get(child_name, None), unmark)
+                        if w:
                             out[child_name] = s
+                            wrote = True
                     case _:
-                        m = conf.get([*prev, child_name], None)
-                        # Skip writing default values
-                        default = child.get("default", None)
-                        if default is None and unmark != "unset":
-                            out[child_name] = None
-                        elif m is None:
-                            out[child_name] = unmark
-                        elif default == m and unmark == "default":
-                            out[child_name] = unmark
-            return out
+                        wrote |= unmark_setting(out, child_name, child, unmark)
         case "mode":
-            out = {}
-            m = conf.get([*prev, "mode"], None)
-            # Skip writing default values
-            default = set.get("default", None)
-            if default is None and unmark != "unset":
-                out["mode"] = None
-            elif m is None:
-                out["mode"] = unmark
-            elif default == m and unmark == "default":
-                out["mode"] = unmark
-
+            wrote = unmark_setting(out, "mode", set, unmark)
             for mode_name, mode in set["modes"].items():
-                s = dump_setting(mode, [*prev, mode_name], conf, unmark)
-                if s:
+                if mode["type"] not in ("container", "mode"):
+                    continue
+                w, s = dump_setting(mode, out.get(mode_name, None), unmark)
+                if w:
                     out[mode_name] = s
-            return out
-
-
-def merge_dicts(a: Mapping | Any, b: Mapping | Any):
-    if isinstance(a, Mapping) and isinstance(b, Mapping):
-        out = dict(a)
-        for k, v in b.items():
-            out[k] = merge_dicts(out.get(k, None), v)
-    elif isinstance(b, Mapping):
-        out = {}
-        for k, v in b.items():
-            out[k] = merge_dicts(None, v)
-    else:
-        return b
+                    wrote = True
+        case _:
+            wrote = False
 
-    for k in list(out.keys()):
-        if out[k] is None:
-            del out[k]
-    if not out:
-        return None
-    return out
+    if not wrote:
+        return False, cur
+    return True, prune_nones(out)
 
 
 def dump_settings(
-    set: HHDSettings, conf: Config, unmark: Literal["unset", "default"] = "default"
+    set: HHDSettings,
+    conf: Config,
+    unmark: Literal["unset", "default"] = "default",
+    shash=None,
 ):
     """Fixes default values for settings in set, drops settings without a default value,
     and retains the rest of the configuration, to not mess with plugins that
     were not loaded."""
-    out: dict = {"version": get_settings_hash(set)}
+    if shash is None:
+        shash = get_settings_hash(set)
+
+    # Written in place over a copy of the configuration, which keeps the
+    # settings of plugins that did not run
+    out: dict = {"version": None, **cast(Mapping, conf.conf)}
+    out["version"] = shash
     for sec_name, sec in set.items():
-        out[sec_name] = {}
+        cur = out.get(sec_name, None)
+        sec_out = cur if isinstance(cur, dict) else {}
         for cont_name, cnt in sec.items():
-            s = dump_setting(cnt, [sec_name, cont_name], conf, unmark)
-            if s:
-                out[sec_name][cont_name] = s
+            w, s = dump_setting(cnt, sec_out.get(cont_name, None), unmark)
+            if w:
+                sec_out[cont_name] = s
+        out[sec_name] = prune_nones(sec_out)
 
-    # Merge dicts to maintain settings for plugins that did not run
-    return merge_dicts({"version": None, **cast(Mapping, conf.conf)}, out)
+    return prune_nones(out)
 
 
 def save_state_yaml(fn: str, set: HHDSettings, conf: Config, shash=None):
-    import yaml
-
     if shash is None:
         shash = get_settings_hash(set)
     if conf.get("version", None) == shash and not conf.updated:
@@ -556,7 +597,12 @@ def save_state_yaml(fn: str, set: HHDSettings, conf: Config, shash=None):
 
     conf["version"] = shash
     with open(fn, "w") as f:
-        yaml.safe_dump(dump_settings(set, conf, "default"), f, sort_keys=False)
+        yaml.dump(
+            dump_settings(set, conf, "default", shash),
+            f,
+            Dumper=SafeDumper,
+            sort_keys=False,
+        )
         f.write("\n")
         f.write(dump_comment(set, STATE_HEADER))
 
@@ -564,8 +610,6 @@ def save_state_yaml(fn: str, set: HHDSettings, conf: Config, shash=None):
 
 
 def save_blacklist_yaml(fn: str, avail: Sequence[str], blacklist: Sequence[str]):
-    import yaml
-
     with open(fn, "w") as f:
         f.write(
             (
@@ -581,17 +625,17 @@ def save_blacklist_yaml(fn: str, avail: Sequence[str], blacklist: Sequence[str])
                 + f"# [{', '.join(avail)}]\n\n"
             )
         )
-        yaml.safe_dump({"blacklist": blacklist}, f, width=85, sort_keys=False)
+        yaml.dump(
+            {"blacklist": blacklist}, f, Dumper=SafeDumper, width=85, sort_keys=False
+        )
 
     return True
 
 
 def load_blacklist_yaml(fn: str):
-    import yaml
-
     try:
         with open(fn, "r") as f:
-            return yaml.safe_load(f)["blacklist"]
+            return yaml.load(f, Loader=SafeLoader)["blacklist"]
     except Exception as e:
         logger.warning(f"Plugin blacklist not found, using default (empty).")
         return ["myplugin1"]
@@ -600,8 +644,6 @@ def load_blacklist_yaml(fn: str):
 def save_profile_yaml(
     fn: str, set: HHDSettings, conf: Config | None = None, shash=None
 ):
-    import yaml
-
     if shash is None:
         shash = get_settings_hash(set)
     if conf is None:
@@ -611,7 +653,13 @@ def save_profile_yaml(
 
     conf["version"] = shash
     with open(fn, "w") as f:
-        yaml.safe_dump(dump_settings(set, conf, "unset"), f, width=85, sort_keys=False)
+        yaml.dump(
+            dump_settings(set, conf, "unset", shash),
+            f,
+            Dumper=SafeDumper,
+            width=85,
+            sort_keys=False,
+        )
         f.write("\n")
         f.write(dump_comment(set, PROFILE_HEADER))
     return True
@@ -639,12 +687,9 @@ def get_default_state(set: HHDSettings):
 
 
 def load_state_yaml(fn: str, set: HHDSettings):
-    import yaml
-
-    defaults = parse_defaults(set)
     try:
         with open(fn, "r") as f:
-            state = cast(Mapping, strip_defaults(yaml.safe_load(f)) or {})
+            state = cast(Mapping, strip_defaults(yaml.load(f, Loader=SafeLoader)) or {})
     except FileNotFoundError:
         logger.warning(f"State file not found. Searched location:\n{fn}")
         return None
@@ -652,15 +697,15 @@ def load_state_yaml(fn: str, set: HHDSettings):
         logger.warning(f"State file is invalid. Searched location:\n{fn}")
         return None
 
-    return Config([defaults, state])
+    if not state:
+        return get_default_state(set)
+    return Config([parse_defaults(set), state])
 
 
 def load_profile_yaml(fn: str):
-    import yaml
-
     try:
         with open(fn, "r") as f:
-            state = cast(Mapping, strip_defaults(yaml.safe_load(f)) or {})
+            state = cast(Mapping, strip_defaults(yaml.load(f, Loader=SafeLoader)) or {})
     except FileNotFoundError:
         logger.warning(
             f"Profile file not found, using defaults. Searched location:\n{fn}"
@@ -675,32 +720,41 @@ def load_profile_yaml(fn: str):
     return Config([state])
 
 
+# Holds a reference to the last hashed settings, so that its id can not be
+# reused while cached. Settings are rebuilt (not mutated) when they change.
+_settings_hash: tuple[HHDSettings, str] | None = None
+
+
 def get_settings_hash(set: HHDSettings):
-    import hashlib, json
+    global _settings_hash
+
+    if _settings_hash and _settings_hash[0] is set:
+        return _settings_hash[1]
 
-    return hashlib.md5(json.dumps(set).encode()).hexdigest()[:8]
+    shash = hashlib.blake2b(json.dumps(set).encode(), digest_size=4).hexdigest()
+    _settings_hash = (set, shash)
+    return shash
 
 
-def unravel(d: Setting | Container | Mode, prev: Sequence[str], out: MutableMapping):
-    new_prev = list(prev)
+def unravel(d: Setting | Container | Mode, prefix: str, out: MutableMapping):
     match d["type"]:
         case "container":
             for k, v in d["children"].items():
-                unravel(v, new_prev + [k], out)
+                unravel(v, f"{prefix}.{k}", out)
         case "mode":
-            out[".".join(new_prev) + ".mode"] = d
+            out[prefix + ".mode"] = d
 
             for k, v in d["modes"].items():
-                unravel(v, new_prev + [k], out)
+                unravel(v, f"{prefix}.{k}", out)
         case _:
-            out[".".join(new_prev)] = d
+            out[prefix] = d
 
 
 def unravel_options(settings: HHDSettings):
     options: Mapping[str, Setting | Mode] = {}
     for name, sec in settings.items():
         for cname, cont in sec.items():
-            unravel(cont, [name, cname], options)
+            unravel(cont, f"{name}.{cname}", options)
 
     return options
 
@@ -777,6 +831,90 @@ def standard_validator(tags, config, value):
 
     return False
 
+
+def _reset(conf: Config, k: str, default: Any, use_defaults: bool):
+    if use_defaults:
+        conf[k] = default
+    else:
+        del conf[k]
+
+
+def _validate_mode(conf, k, d, v, default, use_defaults, validator):
+    if v not in d["modes"]:
+        _reset(conf, k, default, use_defaults)
+
+
+def _validate_bool(conf, k, d, v, default, use_defaults, validator):
+    if type(v) is not bool:
+        conf[k] = bool(v)
+
+
+def _validate_options(conf, k, d, v, default, use_defaults, validator):
+    if v not in d["options"]:
+        _reset(conf, k, default, use_defaults)
+
+
+def _validate_int(conf, k, d, v, default, use_defaults, validator):
+    if not isinstance(v, int):
+        conf[k] = int(v)
+    if v < d["min"]:
+        conf[k] = d["min"]
+    if v > d["max"]:
+        conf[k] = d["max"]
+
+
+def _validate_float(conf, k, d, v, default, use_defaults, validator):
+    if not isinstance(v, float):
+        conf[k] = float(v)
+    if v < d["min"]:
+        conf[k] = d["min"]
+    if v > d["max"]:
+        conf[k] = d["max"]
+
+
+def _validate_color(conf, k, d, v, default, use_defaults, validator):
+    if not isinstance(v, Mapping):
+        invalid = True
+    else:
+        try:
+            # Components in [0, 255] have no bits set above the first byte,
+            # negative ones have all of them set
+            invalid = (v["red"] | v["green"] | v["blue"]) & ~0xFF != 0
+        except KeyError:
+            invalid = True
+        except TypeError:
+            # Not integers (e.g., floats), fall back to a range check
+            invalid = not all(
+                c in v and 0 <= v[c] < 256 for c in ("red", "green", "blue")
+            )
+
+    if invalid:
+        _reset(conf, k, default, use_defaults)
+
+
+def _validate_custom(conf, k, d, v, default, use_defaults, validator):
+    # The standard validator is a few checks, the plugin one asks every plugin
+    if not (
+        standard_validator(d["tags"], d["config"], v)
+        or validator(d["tags"], d["config"], v)
+    ):
+        _reset(conf, k, default, use_defaults)
+
+
+TYPE_VALIDATORS = {
+    "mode": _validate_mode,
+    "bool": _validate_bool,
+    "action": _validate_bool,
+    "multiple": _validate_options,
+    "discrete": _validate_options,
+    "int": _validate_int,
+    "integer": _validate_int,
+    "float": _validate_float,
+    "color": _validate_color,
+    "custom": _validate_custom,
+}
+
+
 def validate_config(
     conf: Config, settings: HHDSettings, validator: Validator, use_defaults: bool = True
 ):
@@ -784,68 +922,13 @@ def validate_config(
 
     for k, d in options.items():
         v = conf.get(k, None)
-        if d["type"] == "action":
-            default = False
-        else:
-            default = d["default"]
+        t = d["type"]
+        # Actions have no default in their settings, they are reset to False
+        default = False if t == "action" else d["default"]
         if v is None:
             if use_defaults and default is not None:
                 conf[k] = default
             continue
 
-        match d["type"]:
-            case "mode":
-                if v not in d["modes"]:
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
-            case "bool" | "action":
-                if v not in (False, True):
-                    conf[k] = bool(v)
-            case "multiple" | "discrete":
-                if v not in d["options"]:
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
-            case "int" | "integer":
-                if not isinstance(v, int):
-                    conf[k] = int(v)
-                if v < d["min"]:
-                    conf[k] = d["min"]
-                if v > d["max"]:
-                    conf[k] = d["max"]
-            case "float":
-                if not isinstance(v, float):
-                    conf[k] = float(v)
-                if v < d["min"]:
-                    conf[k] = d["min"]
-                if v > d["max"]:
-                    conf[k] = d["max"]
-            case "color":
-                invalid = False
-
-                if not isinstance(v, Mapping):
-                    invalid = True
-                else:
-                    for c in ("red", "green", "blue"):
-                        if c not in v:
-                            invalid = True
-                        elif not (0 <= v[c] < 256):
-                            invalid = True
-
-                if invalid:
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
-            case "custom":
-                if not (
-                    validator(d["tags"], d["config"], v)
-                    or standard_validator(d["tags"], d["config"], v)
-                ):
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
+        if check := TYPE_VALIDATORS.get(t, None):
+            check(conf, k, d, v, default, use_defaults, validator)